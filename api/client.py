@@ -1,6 +1,9 @@
 import aiohttp
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import time
+import orjson
+from typing import Optional, Dict, Any, Tuple
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -19,9 +22,38 @@ class ZdravAPIClient:
             'Content-Type': "application/json",
             'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:144.0) Gecko/20100101 Firefox/144.0"
         }
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Кэш ответов API: ключ -> (время получения, данные)
+        self._cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        # Выполняющиеся запросы: одновременные проверки с тем же ключом ждут один запрос
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Получить общую HTTP-сессию (создается лениво внутри event loop)"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(
+                    resolver=aiohttp.AsyncResolver(),
+                    limit=100,
+                    limit_per_host=20,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60,
+                    enable_cleanup_closed=True
+                ),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+    
+    async def close(self):
+        """Закрыть HTTP-сессию"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def get_doctors(self, department_id: int, patient_number: str = None, 
-                         patient_birthday: str = None) -> Optional[Dict[str, Any]]:
+                         patient_birthday: str = None, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
         """
         Получить список врачей для указанного отделения
         
@@ -29,6 +61,8 @@ class ZdravAPIClient:
             department_id: ID отделения (52, 53, 54)
             patient_number: Номер полиса (если None, используется из Config)
             patient_birthday: Дата рождения (если None, используется из Config)
+            allow_stale: При ошибке API вернуть устаревший ответ из кэша
+                (только для отображения: сравнивать его с сохраненным состоянием нельзя)
             
         Returns:
             JSON ответ с данными о врачах или None в случае ошибки
@@ -41,18 +75,55 @@ class ZdravAPIClient:
             'days': Config.API_DAYS
         }
         
-        url = f"{self.base_url}{endpoint}"
+        key = (department_id, params['number'], params['birthday'], params['days'])
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        
+        # Свежий ответ из кэша - повторный запрос не нужен
+        if cached and now - cached[0] < Config.API_CACHE_TTL:
+            logger.debug(f"Данные для department {department_id} взяты из кэша")
+            return cached[1]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_doctors(endpoint, params, department_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не должна отменять запрос для остальных
+        data = await asyncio.shield(task)
+        
+        if data is not None:
+            self._prune_cache(now)
+            self._cache[key] = (now, data)
+            return data
         
+        # API недоступен - отдаем устаревшие данные, если они не слишком старые
+        # и вызывающий код готов их принять
+        if allow_stale and cached and now - cached[0] < Config.API_CACHE_STALE_TTL:
+            logger.warning(f"Используем устаревшие данные из кэша для department {department_id}")
+            return cached[1]
+        
+        return None
+    
+    def _prune_cache(self, now: float):
+        """Удалить из кэша записи старше допустимого срока"""
+        expired = [k for k, (ts, _) in self._cache.items() if now - ts >= Config.API_CACHE_STALE_TTL]
+        for k in expired:
+            del self._cache[k]
+    
+    async def _fetch_doctors(self, endpoint: str, params: Dict[str, Any],
+                             department_id: int) -> Optional[Dict[str, Any]]:
+        """Выполнить HTTP запрос к API"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, headers=self.headers, ssl=True) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"Получены данные для department {department_id}: {len(data.get('items', []))} организаций")
-                        return data
-                    else:
-                        logger.error(f"Ошибка при запросе для department {department_id}: статус {response.status}")
-                        return None
+            session = self._get_session()
+            async with session.get(endpoint, params=params, ssl=True) as response:
+                if response.status == 200:
+                    data = await response.json(loads=orjson.loads)
+                    logger.info(f"Получены данные для department {department_id}: {len(data.get('items', []))} организаций")
+                    return data
+                else:
+                    logger.error(f"Ошибка при запросе для department {department_id}: статус {response.status}")
+                    return None
         except aiohttp.ClientError as e:
             logger.error(f"Ошибка сети при запросе для department {department_id}: {e}")
             return None
@@ -60,20 +131,30 @@ class ZdravAPIClient:
             logger.error(f"Неожиданная ошибка при запросе для department {department_id}: {e}")
             return None
     
-    async def get_all_departments(self, patient_number: str = None, 
-                                 patient_birthday: str = None) -> Dict[int, Optional[Dict[str, Any]]]:
+    async def get_all_departments(self, patient_number: str = None, patient_birthday: str = None,
+                                  allow_stale: bool = False) -> Dict[int, Optional[Dict[str, Any]]]:
         """
         Получить данные для всех настроенных отделений
         
         Args:
             patient_number: Номер полиса (если None, используется из Config)
             patient_birthday: Дата рождения (если None, используется из Config)
+            allow_stale: При ошибке API использовать устаревшие ответы из кэша
         
         Returns:
             Словарь {department_id: данные}
         """
+        logger.info(f"Запрашиваем данные для departments {Config.DEPARTMENT_IDS}")
+        responses = await asyncio.gather(
+            *(self.get_doctors(dept_id, patient_number, patient_birthday, allow_stale)
+              for dept_id in Config.DEPARTMENT_IDS),
+            return_exceptions=True
+        )
+        
         results = {}
-        for dept_id in Config.DEPARTMENT_IDS:
-            logger.info(f"Запрашиваем данные для department {dept_id}")
-            results[dept_id] = await self.get_doctors(dept_id, patient_number, patient_birthday)
+        for dept_id, response in zip(Config.DEPARTMENT_IDS, responses):
+            if isinstance(response, BaseException):
+                logger.error(f"Неожиданная ошибка при запросе для department {dept_id}: {response}")
+                response = None
+            results[dept_id] = response
         return results
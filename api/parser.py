@@ -1,66 +1,17 @@
 from typing import Dict, Any, List
-from datetime import datetime
 import logging
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Фильтры врачей вычисляются один раз при импорте (O(1) проверка вхождения)
+ALLOWED_DOCTORS = frozenset(Config.ALLOWED_DOCTORS)
+EXCLUDED_POSITIONS = frozenset(Config.EXCLUDED_POSITIONS)
+
 
 class AppointmentParser:
     """Парсер данных о записях к врачам"""
     
-    @staticmethod
-    def parse_doctor_data(doctor: Dict[str, Any], lpu: Dict[str, Any], department_id: int) -> Dict[str, Any]:
-        """
-        Парсинг данных врача/кабинета
-        
-        Args:
-            doctor: Данные о враче из API
-            lpu: Данные о медучреждении
-            department_id: ID отделения
-            
-        Returns:
-            Словарь с обработанными данными
-        """
-        return {
-            'id': doctor.get('id'),
-            'department_id': department_id,
-            'display_name': doctor.get('displayName', 'Неизвестно'),
-            'person_id': doctor.get('person_id'),
-            'position': doctor.get('position'),
-            'position_code': doctor.get('positionCode'),
-            'room': doctor.get('room'),
-            'lpu_name': lpu.get('name'),
-            'lpu_address': lpu.get('address'),
-            'separation': doctor.get('separation'),
-            'type': doctor.get('type'),
-            'type_name': doctor.get('type_name'),
-            'rating': doctor.get('rating'),
-            'phone': lpu.get('phone')
-        }
-    
-    @staticmethod
-    def parse_schedule_item(schedule_item: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Парсинг элемента расписания
-        
-        Args:
-            schedule_item: Элемент расписания из API
-            
-        Returns:
-            Обработанные данные расписания
-        """
-        doc_busy_type = schedule_item.get('docBusyType', {})
-        
-        return {
-            'date': schedule_item.get('date', '').split('T')[0],  # Только дата без времени
-            'time_from': schedule_item.get('time_from', ''),
-            'time_to': schedule_item.get('time_to', ''),
-            'count_tickets': schedule_item.get('count_tickets', 0),
-            'doc_busy_type': doc_busy_type.get('name'),
-            'doc_busy_type_code': doc_busy_type.get('code')
-        }
-    
     @staticmethod
     def parse_closest_entry(closest_entry: Dict[str, Any]) -> str:
         """
@@ -89,71 +40,115 @@ class AppointmentParser:
             Список доступных записей с полной информацией
         """
         available_appointments = []
+        # Ключи (id врача, дата) уже добавленных записей
+        seen = set()
         
         if not api_response or 'items' not in api_response:
             return available_appointments
         
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        
         for lpu_item in api_response['items']:
             lpu = lpu_item.get('lpu', {})
             doctors = lpu_item.get('doctors', [])
+            lpu_name = lpu.get('name')
+            lpu_address = lpu.get('address')
+            lpu_phone = lpu.get('phone')
             
             for doctor in doctors:
-                # Парсим данные врача
-                doctor_info = AppointmentParser.parse_doctor_data(doctor, lpu, department_id)
+                get_doctor = doctor.get
+                display_name = get_doctor('displayName', 'Неизвестно')
+                position = get_doctor('position')
                 
                 # Фильтр 1: Белый список врачей (приоритет выше)
                 # Если список не пустой - показываем ТОЛЬКО врачей из списка
-                if Config.ALLOWED_DOCTORS:
-                    if doctor_info.get('display_name') not in Config.ALLOWED_DOCTORS:
-                        logger.debug(f"Пропускаем врача (не в белом списке): {doctor_info.get('display_name')}")
+                if ALLOWED_DOCTORS:
+                    if display_name not in ALLOWED_DOCTORS:
+                        if debug_enabled:
+                            logger.debug(f"Пропускаем врача (не в белом списке): {display_name}")
                         continue
                 
                 # Фильтр 2: Исключаем нежелательные специальности (если белый список пустой)
-                elif doctor_info.get('position') in Config.EXCLUDED_POSITIONS:
-                    logger.debug(f"Пропускаем врача с исключенной специальностью: {doctor_info.get('position')}")
+                elif position in EXCLUDED_POSITIONS:
+                    if debug_enabled:
+                        logger.debug(f"Пропускаем врача с исключенной специальностью: {position}")
                     continue
                 
                 # Парсим расписание
-                schedule = doctor.get('schedule', [])
-                closest_entry = doctor.get('closestEntry')
+                schedule = get_doctor('schedule', [])
+                closest_entry = get_doctor('closestEntry')
+                closest_time = AppointmentParser.parse_closest_entry(closest_entry)
+                
+                # Нет ни расписания, ни ближайшей записи - данные врача не нужны
+                if not schedule and not closest_time:
+                    continue
+                
+                # Данные врача/кабинета
+                doctor_id = get_doctor('id')
+                doctor_info = {
+                    'id': doctor_id,
+                    'department_id': department_id,
+                    'display_name': display_name,
+                    'person_id': get_doctor('person_id'),
+                    'position': position,
+                    'position_code': get_doctor('positionCode'),
+                    'room': get_doctor('room'),
+                    'lpu_name': lpu_name,
+                    'lpu_address': lpu_address,
+                    'separation': get_doctor('separation'),
+                    'type': get_doctor('type'),
+                    'type_name': get_doctor('type_name'),
+                    'rating': get_doctor('rating'),
+                    'phone': lpu_phone
+                }
                 
                 for schedule_item in schedule:
-                    parsed_schedule = AppointmentParser.parse_schedule_item(schedule_item)
+                    get_item = schedule_item.get
+                    count_tickets = get_item('count_tickets', 0)
                     
                     # Интересуют только дни с доступными талонами
-                    if parsed_schedule['count_tickets'] > 0:
-                        appointment = {
-                            **doctor_info,
-                            **parsed_schedule,
-                            'closest_entry_time': AppointmentParser.parse_closest_entry(closest_entry)
-                        }
+                    if count_tickets > 0:
+                        doc_busy_type = get_item('docBusyType', {})
+                        date = get_item('date', '')[:10]  # Только дата без времени (ГГГГ-ММ-ДД)
+                        # copy() + присваивания дешевле, чем {**doctor_info, ...}
+                        appointment = doctor_info.copy()
+                        appointment['date'] = date
+                        appointment['time_from'] = get_item('time_from', '')
+                        appointment['time_to'] = get_item('time_to', '')
+                        appointment['count_tickets'] = count_tickets
+                        appointment['doc_busy_type'] = doc_busy_type.get('name')
+                        appointment['doc_busy_type_code'] = doc_busy_type.get('code')
+                        appointment['closest_entry_time'] = closest_time
                         available_appointments.append(appointment)
+                        seen.add((doctor_id, date))
                 
                 # Также добавляем информацию о ближайшей записи, если есть
-                if closest_entry:
-                    # Проверяем, не добавили ли мы уже эту запись
-                    closest_time = AppointmentParser.parse_closest_entry(closest_entry)
-                    if closest_time:
-                        closest_date = closest_time.split('T')[0]
-                        
-                        # Ищем, есть ли уже запись на эту дату
-                        date_exists = any(
-                            apt['date'] == closest_date and apt['id'] == doctor_info['id']
-                            for apt in available_appointments
-                        )
+                if closest_time:
+                    closest_date = closest_time[:10]
+                    
+                    # Проверяем, не добавили ли мы уже запись на эту дату
+                    key = (doctor_id, closest_date)
+                    
+                    if key not in seen:
+                        # Время после 'T' до смещения часового пояса (ГГГГ-ММ-ДДTЧЧ:ММ:СС+03:00)
+                        if len(closest_time) > 11 and closest_time[10] == 'T':
+                            tz_idx = closest_time.find('+', 11)
+                            if tz_idx == -1:
+                                tz_idx = closest_time.find('Z', 11)
+                            closest_time_from = closest_time[11:tz_idx] if tz_idx != -1 else closest_time[11:]
+                        else:
+                            closest_time_from = ''
                         
-                        if not date_exists:
-                            appointment = {
-                                **doctor_info,
-                                'date': closest_date,
-                                'time_from': closest_time.split('T')[1].split('+')[0] if 'T' in closest_time else '',
-                                'time_to': '',
-                                'count_tickets': 0,  # Не знаем точное количество
-                                'doc_busy_type': 'Ближайшая доступная запись',
-                                'doc_busy_type_code': 'closest',
-                                'closest_entry_time': closest_time
-                            }
-                            available_appointments.append(appointment)
+                        appointment = doctor_info.copy()
+                        appointment['date'] = closest_date
+                        appointment['time_from'] = closest_time_from
+                        appointment['time_to'] = ''
+                        appointment['count_tickets'] = 0  # Не знаем точное количество
+                        appointment['doc_busy_type'] = 'Ближайшая доступная запись'
+                        appointment['doc_busy_type_code'] = 'closest'
+                        appointment['closest_entry_time'] = closest_time
+                        available_appointments.append(appointment)
+                        seen.add(key)
         
         logger.info(f"Department {department_id}: найдено {len(available_appointments)} доступных записей")
         return available_appointments
@@ -2,10 +2,14 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message
 from config import Config
+from utils.formatter import MessageFormatter
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Белый список (frozenset) - локальная ссылка без поиска атрибута Config на каждый апдейт
+WHITELIST_USER_IDS = Config.WHITELIST_USER_IDS
+
 
 class WhitelistMiddleware(BaseMiddleware):
     """Middleware для проверки пользователей по белому списку"""
@@ -35,7 +39,7 @@ class WhitelistMiddleware(BaseMiddleware):
         user_id = user.id
         
         # Проверяем, есть ли пользователь в белом списке
-        if user_id not in Config.WHITELIST_USER_IDS:
+        if user_id not in WHITELIST_USER_IDS:
             logger.warning(
                 f"Попытка доступа от неавторизованного пользователя: "
                 f"ID={user_id}, username={user.username}"
@@ -43,7 +47,6 @@ class WhitelistMiddleware(BaseMiddleware):
             
             # Если это сообщение, отправляем уведомление об отказе
             if isinstance(event, Message):
-                from utils.formatter import MessageFormatter
                 await event.answer(
                     MessageFormatter.format_access_denied(),
                     parse_mode="HTML"
@@ -52,5 +55,6 @@ class WhitelistMiddleware(BaseMiddleware):
             return  # Прерываем обработку
         
         # Пользователь в белом списке, продолжаем обработку
-        logger.info(f"Доступ разрешен для пользователя: ID={user_id}, username={user.username}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Доступ разрешен для пользователя: ID={user_id}, username={user.username}")
         return await handler(event, data)
@@ -1,11 +1,23 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Set, Tuple
 from aiogram import Bot
-from database.db import Database
+from database.db import Database, SQLITE_TIMESTAMP_FORMAT
 from utils.formatter import MessageFormatter
 
 logger = logging.getLogger(__name__)
 
+# Максимум одновременных запросов send_message (глобальный лимит Telegram ~30 сообщений/сек)
+SEND_CONCURRENCY = 30
+
+# Тип уведомления о новой записи и окно, в течение которого оно не повторяется
+NEW_APPOINTMENT_TYPE = 'new_appointment'
+NOTIFY_REPEAT_HOURS = 24
+# Как часто вычищать устаревшие ключи из памяти (в секундах)
+RECENT_PRUNE_INTERVAL = 300
+
 
 class NotificationService:
     """Сервис для отправки уведомлений пользователям"""
@@ -14,6 +26,62 @@ class NotificationService:
         self.bot = bot
         self.db = db
         self.formatter = MessageFormatter()
+        # Общий лимит одновременных отправок для всех вызовов сервиса
+        self._send_semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        # Недавние уведомления: (user_id, doctor_id, date) -> время отправки (unix time)
+        self._recent: Dict[Tuple[int, str, str], float] = {}
+        self._recent_loaded = False
+        self._last_prune = 0.0
+    
+    async def load_recent_notifications(self):
+        """Загрузить из БД уведомления за окно повтора, чтобы проверять дубли в памяти"""
+        rows = await self.db.get_recent_notifications(NEW_APPOINTMENT_TYPE, NOTIFY_REPEAT_HOURS)
+        for user_id, doctor_id, date, sent_at in rows:
+            sent_ts = datetime.strptime(sent_at, SQLITE_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+            key = (user_id, doctor_id, date)
+            self._recent[key] = max(sent_ts, self._recent.get(key, 0.0))
+        self._recent_loaded = True
+        self._last_prune = time.time()
+        logger.info(f"Загружено {len(self._recent)} недавних уведомлений")
+    
+    def _prune_recent(self, now: float):
+        """Удалить ключи, вышедшие за окно повтора"""
+        cutoff = now - NOTIFY_REPEAT_HOURS * 3600
+        self._recent = {key: sent_ts for key, sent_ts in self._recent.items() if sent_ts > cutoff}
+        self._last_prune = now
+    
+    async def _get_already_sent(self, user_id: int, keys: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        """
+        Получить пары (doctor_id, date), о которых пользователь уже уведомлялся в окне повтора
+        
+        Пока недавние уведомления не загружены в память, спрашиваем БД
+        """
+        if not self._recent_loaded:
+            return await self.db.get_notified_keys(
+                user_id=user_id,
+                keys=keys,
+                notification_type=NEW_APPOINTMENT_TYPE,
+                hours=NOTIFY_REPEAT_HOURS
+            )
+        
+        now = time.time()
+        if now - self._last_prune >= RECENT_PRUNE_INTERVAL:
+            self._prune_recent(now)
+        
+        cutoff = now - NOTIFY_REPEAT_HOURS * 3600
+        recent = self._recent
+        return {
+            key for key in keys
+            if recent.get((user_id, key[0], key[1]), 0.0) > cutoff
+        }
+    
+    async def _save_sent(self, user_id: int, sent: List[Tuple[str, str, str]]):
+        """Сохранить отправленные уведомления в БД и в памяти"""
+        await self.db.add_notifications(user_id, sent, notification_type=NEW_APPOINTMENT_TYPE)
+        
+        now = time.time()
+        for doctor_id, date, _ in sent:
+            self._recent[(user_id, doctor_id, date)] = now
     
     async def notify_new_appointments(self, appointments: List[Dict[str, Any]]):
         """
@@ -35,53 +103,131 @@ class NotificationService:
         
         logger.info(f"Отправка {len(appointments)} уведомлений {len(active_users)} пользователям")
         
-        # Отправляем уведомления каждому пользователю
+        appointment_keys = [(appointment['id'], appointment['date']) for appointment in appointments]
+        
+        # Текст уведомления одинаков для всех пользователей - форматируем один раз
+        messages = [self.formatter.format_appointment(appointment) for appointment in appointments]
+        
+        # Для каждого пользователя отбираем записи, о которых он еще не уведомлен
+        pending = []
         for user_id in active_users:
-            for appointment in appointments:
-                try:
-                    # Проверяем, не отправляли ли уже это уведомление
-                    was_sent = await self.db.was_notified(
-                        user_id=user_id,
-                        doctor_id=appointment['id'],
-                        date=appointment['date'],
-                        notification_type='new_appointment',
-                        hours=24  # Не отправляем повторно в течение 24 часов
-                    )
-                    
-                    if was_sent:
-                        logger.debug(
-                            f"Уведомление для пользователя {user_id} уже отправлялось, пропускаем"
-                        )
-                        continue
-                    
-                    # Форматируем сообщение
-                    message_text = self.formatter.format_appointment(appointment)
-                    
-                    # Отправляем сообщение
-                    await self.bot.send_message(
-                        chat_id=user_id,
-                        text=message_text,
-                        parse_mode="HTML"
-                    )
-                    
-                    # Сохраняем информацию об отправленном уведомлении
-                    await self.db.add_notification(
-                        user_id=user_id,
-                        doctor_id=appointment['id'],
-                        date=appointment['date'],
-                        notification_type='new_appointment',
-                        message_text=message_text
-                    )
-                    
-                    logger.info(
-                        f"Уведомление отправлено пользователю {user_id}: "
-                        f"{appointment['display_name']}, {appointment['date']}"
-                    )
-                    
-                except Exception as e:
-                    logger.error(
-                        f"Ошибка при отправке уведомления пользователю {user_id}: {e}"
+            try:
+                # Проверяем, какие уведомления уже отправлялись
+                # Не отправляем повторно в течение NOTIFY_REPEAT_HOURS часов
+                already_sent = await self._get_already_sent(user_id, appointment_keys)
+            except Exception as e:
+                logger.error(
+                    f"Ошибка при проверке уведомлений пользователя {user_id}: {e}"
+                )
+                continue
+            
+            for appointment, key, message_text in zip(appointments, appointment_keys, messages):
+                if key in already_sent:
+                    logger.debug(
+                        "Уведомление для пользователя %s уже отправлялось, пропускаем", user_id
                     )
+                    continue
+                already_sent.add(key)
+                pending.append((user_id, appointment, message_text))
+        
+        if not pending:
+            logger.info("Все уведомления уже были отправлены ранее")
+            return
+        
+        # Отправляем сообщения параллельно, ограничивая число одновременных запросов
+        results = await asyncio.gather(
+            *(self._send_appointment(user_id, appointment, message_text)
+              for user_id, appointment, message_text in pending)
+        )
+        
+        sent_by_user: Dict[int, List[Tuple[str, str, str]]] = {}
+        for (user_id, appointment, message_text), is_sent in zip(pending, results):
+            if is_sent:
+                sent_by_user.setdefault(user_id, []).append(
+                    (appointment['id'], appointment['date'], message_text)
+                )
+        
+        # Сохраняем информацию об отправленных уведомлениях одной транзакцией на пользователя
+        for user_id, sent in sent_by_user.items():
+            try:
+                await self._save_sent(user_id, sent)
+            except Exception as e:
+                logger.error(
+                    f"Ошибка при сохранении уведомлений пользователя {user_id}: {e}"
+                )
+    
+    async def notify_user(self, user_id: int, appointments: List[Dict[str, Any]]):
+        """
+        Отправить пользователю уведомления о его новых записях
+        
+        Проверка дублей, отправка и сохранение выполняются пакетно:
+        один запрос к БД до отправки и одна транзакция после
+        
+        Args:
+            user_id: ID пользователя
+            appointments: Список новых записей пользователя
+        """
+        if not appointments:
+            return
+        
+        # Проверяем, какие уведомления уже отправлялись
+        already_sent = await self._get_already_sent(
+            user_id, [(appointment['id'], appointment['date']) for appointment in appointments]
+        )
+        
+        pending = []
+        for appointment in appointments:
+            key = (appointment['id'], appointment['date'])
+            if key in already_sent:
+                continue
+            already_sent.add(key)
+            pending.append((appointment, self.formatter.format_appointment(appointment)))
+        
+        if not pending:
+            return
+        
+        # Отправляем сообщения параллельно, ограничивая число одновременных запросов
+        results = await asyncio.gather(
+            *(self._send_appointment(user_id, appointment, message_text)
+              for appointment, message_text in pending)
+        )
+        
+        # Сохраняем информацию об отправленных уведомлениях одной транзакцией
+        sent = [
+            (appointment['id'], appointment['date'], message_text)
+            for (appointment, message_text), is_sent in zip(pending, results)
+            if is_sent
+        ]
+        await self._save_sent(user_id, sent)
+    
+    async def _send_appointment(self, user_id: int, appointment: Dict[str, Any],
+                                message_text: str) -> bool:
+        """
+        Отправить уведомление о записи одному пользователю
+        
+        Returns:
+            True если сообщение отправлено
+        """
+        async with self._send_semaphore:
+            try:
+                # Отправляем сообщение
+                await self.bot.send_message(
+                    chat_id=user_id,
+                    text=message_text,
+                    parse_mode="HTML"
+                )
+                
+                logger.info(
+                    f"Уведомление отправлено пользователю {user_id}: "
+                    f"{appointment['display_name']}, {appointment['date']}"
+                )
+                return True
+                
+            except Exception as e:
+                logger.error(
+                    f"Ошибка при отправке уведомления пользователю {user_id}: {e}"
+                )
+                return False
     
     async def notify_stats(self, user_id: int, stats: Dict[str, Any]):
         """
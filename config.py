@@ -16,17 +16,19 @@ class Config:
     PATIENT_BIRTHDAY = os.getenv("PATIENT_BIRTHDAY")
     
     # Department IDs для мониторинга
-    DEPARTMENT_IDS = [int(d.strip()) for d in os.getenv("DEPARTMENT_IDS", "52,53,54").split(",")]
+    DEPARTMENT_IDS = tuple(int(d.strip()) for d in os.getenv("DEPARTMENT_IDS", "52,53,54").split(","))
     
     # Интервал проверки (в минутах)
     CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "3"))
     
     # Белый список пользователей (Telegram User IDs)
-    WHITELIST_USER_IDS = [int(uid.strip()) for uid in os.getenv("WHITELIST_USER_IDS", "").split(",") if uid.strip()]
+    WHITELIST_USER_IDS = frozenset(int(uid.strip()) for uid in os.getenv("WHITELIST_USER_IDS", "").split(",") if uid.strip())
     
     # API настройки
     API_BASE_URL = "zdrav.mosreg.ru"
     API_DAYS = 21  # Количество дней для проверки
+    API_CACHE_TTL = int(os.getenv("API_CACHE_TTL", "60"))  # Время жизни кэша ответов API (в секундах)
+    API_CACHE_STALE_TTL = 600  # Сколько секунд отдавать устаревший ответ, если API недоступен
     
     # Фильтрация специальностей (исключаем нежелательные позиции)
     EXCLUDED_POSITIONS = [
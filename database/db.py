@@ -1,100 +1,366 @@
 import aiosqlite
+import asyncio
 import logging
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Формат CURRENT_TIMESTAMP в SQLite (время UTC)
+SQLITE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Данные врача обновляются только если изменились имя или кабинет
+SAVE_DOCTOR_SQL = """
+    INSERT INTO doctors (
+        id, department_id, display_name, person_id, position, position_code,
+        room, lpu_name, lpu_address, separation, type, type_name, last_updated
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(id) DO UPDATE SET
+        display_name = excluded.display_name,
+        room = excluded.room,
+        last_updated = CURRENT_TIMESTAMP
+    WHERE doctors.display_name IS NOT excluded.display_name
+       OR doctors.room IS NOT excluded.room
+"""
+
+# Для каждой пары (врач, дата) хранится только последнее состояние
+SAVE_SCHEDULE_STATE_SQL = """
+    INSERT INTO schedule_state (
+        doctor_id, date, count_tickets, time_from, time_to,
+        doc_busy_type, closest_entry_time, checked_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(doctor_id, date) DO UPDATE SET
+        count_tickets = excluded.count_tickets,
+        time_from = excluded.time_from,
+        time_to = excluded.time_to,
+        doc_busy_type = excluded.doc_busy_type,
+        closest_entry_time = excluded.closest_entry_time,
+        checked_at = excluded.checked_at
+"""
+
 
 class Database:
     """Класс для работы с SQLite базой данных"""
     
+    # Время жизни кэша статуса активности пользователя (в секундах);
+    # все изменения статуса через Database сбрасывают кэш, TTL лишь страховка
+    ACTIVE_CACHE_TTL = 60
+    # Время жизни кэша настроек пользователя (в секундах)
+    SETTINGS_CACHE_TTL = 300
+    # Колонки настроек пользователя и состояния расписания (в порядке SELECT)
+    USER_SETTINGS_COLUMNS = (
+        'patient_number', 'patient_birthday', 'check_interval_minutes',
+        'filter_period_days', 'last_check_time'
+    )
+    SCHEDULE_STATE_COLUMNS = (
+        'doctor_id', 'date', 'count_tickets', 'time_from', 'time_to',
+        'doc_busy_type', 'closest_entry_time', 'checked_at'
+    )
+    # Максимум пар (doctor_id, date) в одном запросе get_last_schedule_states
+    STATE_LOOKUP_CHUNK = 500
+    # Максимум пар (doctor_id, date) в кэше последних состояний расписания
+    STATE_CACHE_SIZE = 50000
+    # Количество соединений только для чтения (в WAL читатели не ждут писателя)
+    READER_POOL_SIZE = min(4, os.cpu_count() or 1)
+    # Периодичность checkpoint журнала WAL (в секундах)
+    WAL_CHECKPOINT_INTERVAL = 600
+    
     def __init__(self, db_path: str):
         self.db_path = db_path
+        # Кэши данных пользователей: user_id -> (время, значение)
+        self._active_cache: Dict[int, Tuple[float, bool]] = {}
+        self._settings_cache: Dict[int, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        # Счетчик записей в строку пользователя: _load_user не кладет в кэш снимок,
+        # прочитанный параллельно с записью (он может быть уже устаревшим)
+        self._user_versions: Dict[int, int] = {}
+        # LRU последних состояний расписания: (doctor_id, date) -> состояние.
+        # schedule_state пишется только через save_check_results, который обновляет кэш
+        self._state_cache: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        # Долгоживущее соединение-писатель (открывается в connect())
+        self._conn: Optional[aiosqlite.Connection] = None
+        # Пул соединений только для чтения: свободные соединения лежат в очереди
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._readers: Optional[asyncio.Queue] = None
+        # SQLite допускает одного писателя: не даем корутинам перемешивать запись и commit()
+        self._write_lock = asyncio.Lock()
+        # Фоновая задача периодического checkpoint (запускается в connect())
+        self._checkpoint_task: Optional[asyncio.Task] = None
+    
+    async def connect(self):
+        """Открыть соединение с базой данных"""
+        if self._conn is not None:
+            return
+        # Соединение долгоживущее, поэтому кэш подготовленных запросов sqlite3 переиспользуется
+        self._conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        self._conn.row_factory = aiosqlite.Row
+        
+        # WAL: читатели не блокируются писателем, fsync только на checkpoint
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+        await self._conn.execute("PRAGMA temp_store=MEMORY")
+        await self._conn.execute("PRAGMA mmap_size=134217728")
+        await self._conn.execute("PRAGMA cache_size=-20000")
+        # Ждем освобождения блокировки вместо немедленной ошибки "database is locked"
+        # (с запасом на время checkpoint)
+        await self._conn.execute("PRAGMA busy_timeout=30000")
+        
+        self._readers = asyncio.Queue()
+        for _ in range(self.READER_POOL_SIZE):
+            # Читатели возвращают обычные кортежи: строки разбираются по позиции, без aiosqlite.Row
+            reader = await aiosqlite.connect(self.db_path, cached_statements=256)
+            await reader.execute("PRAGMA query_only=1")
+            await reader.execute("PRAGMA temp_store=MEMORY")
+            await reader.execute("PRAGMA mmap_size=134217728")
+            await reader.execute("PRAGMA busy_timeout=30000")
+            self._reader_conns.append(reader)
+            self._readers.put_nowait(reader)
+        
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+    
+    async def close(self):
+        """Закрыть соединения с базой данных"""
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        
+        for reader in self._reader_conns:
+            await reader.close()
+        self._reader_conns.clear()
+        self._readers = None
+        
+        if self._conn is not None:
+            # Читатели закрыты - переносим журнал полностью и обрезаем его
+            await self.checkpoint(truncate=True)
+            # Обновляем статистику планировщика запросов по накопленной нагрузке
+            await self._conn.execute("PRAGMA optimize")
+            await self._conn.close()
+            self._conn = None
+    
+    async def checkpoint(self, truncate: bool = False):
+        """
+        Перенести WAL в основной файл БД
+        
+        Args:
+            truncate: Дождаться читателей и писателей и обрезать журнал (TRUNCATE).
+                По умолчанию PASSIVE: переносится то, что можно, без ожидания
+                и без блокировки записи
+        """
+        if truncate:
+            async with self._write_lock:
+                await self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        else:
+            await self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    
+    async def _checkpoint_loop(self):
+        """Периодически делать checkpoint, чтобы WAL не разрастался между автоматическими"""
+        while True:
+            await asyncio.sleep(self.WAL_CHECKPOINT_INTERVAL)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.error(f"Ошибка при checkpoint журнала WAL: {e}", exc_info=True)
+    
+    @staticmethod
+    def _utc_cutoff(hours: int) -> str:
+        """
+        Граница "N часов назад" в формате CURRENT_TIMESTAMP
+        
+        Вычисляется в Python, чтобы условие sent_at > ? шло по индексу,
+        а не считало datetime() для каждой строки
+        """
+        return (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime(SQLITE_TIMESTAMP_FORMAT)
+    
+    @asynccontextmanager
+    async def _acquire_reader(self):
+        """Взять свободное соединение для чтения из пула"""
+        reader = await self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put_nowait(reader)
+    
+    def _cache_schedule_state(self, key: Tuple[str, str], state: Dict[str, Any]):
+        """Запомнить состояние расписания в LRU, вытесняя самые старые пары"""
+        self._state_cache[key] = state
+        self._state_cache.move_to_end(key)
+        if len(self._state_cache) > self.STATE_CACHE_SIZE:
+            self._state_cache.popitem(last=False)
+    
+    def _bump_user_version(self, user_id: int):
+        """Отметить запись в строку пользователя (вызывается после commit)"""
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+    
+    def _update_cached_settings(self, user_id: int, **fields):
+        """Обновить закэшированные настройки пользователя (write-through)"""
+        self._bump_user_version(user_id)
+        entry = self._settings_cache.get(user_id)
+        if entry is None:
+            return
+        if entry[1] is None:
+            # Пользователя не было в БД - кэш больше не актуален
+            del self._settings_cache[user_id]
+        else:
+            entry[1].update(fields)
         
     async def init_db(self):
         """Инициализация базы данных и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Таблица пользователей (белый список)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    is_notifications_enabled BOOLEAN DEFAULT 1,
-                    patient_number TEXT,
-                    patient_birthday TEXT,
-                    check_interval_minutes INTEGER DEFAULT 5,
-                    filter_period_days INTEGER DEFAULT 7,
-                    last_check_time TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Таблица врачей/кабинетов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS doctors (
-                    id TEXT PRIMARY KEY,
-                    department_id INTEGER NOT NULL,
-                    display_name TEXT NOT NULL,
-                    person_id TEXT,
-                    position TEXT,
-                    position_code TEXT,
-                    room TEXT,
-                    lpu_name TEXT,
-                    lpu_address TEXT,
-                    separation TEXT,
-                    type INTEGER,
-                    type_name TEXT,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Таблица состояний расписания (для отслеживания изменений)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS schedule_state (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    doctor_id TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    count_tickets INTEGER NOT NULL,
-                    time_from TEXT,
-                    time_to TEXT,
-                    doc_busy_type TEXT,
-                    closest_entry_time TEXT,
-                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+        await self.connect()
+        
+        # Таблица пользователей (белый список)
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                is_active BOOLEAN DEFAULT 1,
+                is_notifications_enabled BOOLEAN DEFAULT 1,
+                patient_number TEXT,
+                patient_birthday TEXT,
+                check_interval_minutes INTEGER DEFAULT 5,
+                filter_period_days INTEGER DEFAULT 7,
+                last_check_time TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Таблица врачей/кабинетов
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS doctors (
+                id TEXT PRIMARY KEY,
+                department_id INTEGER NOT NULL,
+                display_name TEXT NOT NULL,
+                person_id TEXT,
+                position TEXT,
+                position_code TEXT,
+                room TEXT,
+                lpu_name TEXT,
+                lpu_address TEXT,
+                separation TEXT,
+                type INTEGER,
+                type_name TEXT,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Старая схема хранила всю историю проверок - переносим только последние состояния
+        columns = await self._conn.execute_fetchall("PRAGMA table_info(schedule_state)")
+        migrate_schedule_state = any(column['name'] == 'id' for column in columns)
+        if migrate_schedule_state:
+            await self._conn.execute("ALTER TABLE schedule_state RENAME TO schedule_state_old")
+        
+        # Таблица состояний расписания: одна строка на (врач, дата) с последним состоянием
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS schedule_state (
+                doctor_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                count_tickets INTEGER NOT NULL,
+                time_from TEXT,
+                time_to TEXT,
+                doc_busy_type TEXT,
+                closest_entry_time TEXT,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (doctor_id, date),
+                FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+            ) WITHOUT ROWID
+        """)
+        
+        if migrate_schedule_state:
+            await self._conn.execute("""
+                INSERT INTO schedule_state (
+                    doctor_id, date, count_tickets, time_from, time_to,
+                    doc_busy_type, closest_entry_time, checked_at
                 )
+                SELECT doctor_id, date, count_tickets, time_from, time_to,
+                       doc_busy_type, closest_entry_time, checked_at
+                FROM schedule_state_old
+                WHERE id IN (SELECT MAX(id) FROM schedule_state_old GROUP BY doctor_id, date)
             """)
-            
-            # Таблица отправленных уведомлений (чтобы не дублировать)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    doctor_id TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    notification_type TEXT NOT NULL,
-                    message_text TEXT,
-                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+            await self._conn.execute("DROP TABLE schedule_state_old")
+            logger.info("Таблица schedule_state переведена на хранение последнего состояния")
+        
+        # AUTOINCREMENT заставлял обновлять sqlite_sequence при каждой вставке
+        rows = await self._conn.execute_fetchall(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notifications'"
+        )
+        migrate_notifications = bool(rows) and 'AUTOINCREMENT' in rows[0][0].upper()
+        if migrate_notifications:
+            await self._conn.execute("ALTER TABLE notifications RENAME TO notifications_old")
+        
+        # Таблица отправленных уведомлений (чтобы не дублировать);
+        # id - псевдоним rowid без AUTOINCREMENT
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                doctor_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                notification_type TEXT NOT NULL,
+                message_text TEXT,
+                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id),
+                FOREIGN KEY (doctor_id) REFERENCES doctors(id)
+            )
+        """)
+        
+        if migrate_notifications:
+            await self._conn.execute("""
+                INSERT INTO notifications (
+                    id, user_id, doctor_id, date, notification_type, message_text, sent_at
                 )
+                SELECT id, user_id, doctor_id, date, notification_type, message_text, sent_at
+                FROM notifications_old
             """)
-            
-            # Индексы для быстрого поиска
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_schedule_doctor_date ON schedule_state(doctor_id, date)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, sent_at)")
-            
-            await db.commit()
-            logger.info("База данных инициализирована")
+            # Вместе со старой таблицей удаляются и ее индексы - ниже они создаются заново
+            await self._conn.execute("DROP TABLE notifications_old")
+            logger.info("Таблица notifications пересоздана без AUTOINCREMENT")
+        
+        # Индексы для быстрого поиска
+        # schedule_state ищется по первичному ключу (doctor_id, date) - отдельные индексы не нужны
+        await self._conn.execute("DROP INDEX IF EXISTS idx_schedule_doctor_date")
+        await self._conn.execute("DROP INDEX IF EXISTS idx_schedule_doctor_date_checked")
+        # Частичный индекс только по пользователям, участвующим в плановых проверках
+        await self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_due ON users(last_check_time)
+            WHERE is_active = 1 
+              AND is_notifications_enabled = 1
+              AND patient_number IS NOT NULL 
+              AND patient_birthday IS NOT NULL
+        """)
+        await self._conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, sent_at)")
+        await self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_notifications_lookup "
+            "ON notifications(user_id, doctor_id, date, notification_type, sent_at DESC)"
+        )
+        
+        await self._conn.commit()
+        
+        # При первом запуске собираем статистику для выбора индексов,
+        # в остальных случаях SQLite обновляет ее только там, где она устарела
+        rows = await self._conn.execute_fetchall(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        )
+        if not rows:
+            await self._conn.execute("ANALYZE")
+            await self._conn.commit()
+        else:
+            await self._conn.execute("PRAGMA optimize")
+        
+        logger.info("База данных инициализирована")
     
     async def add_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
         """Добавить или обновить пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with self._write_lock:
+            await self._conn.execute("""
                 INSERT INTO users (user_id, username, first_name, last_name, last_activity)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(user_id) DO UPDATE SET
@@ -103,85 +369,128 @@ class Database:
                     last_name = excluded.last_name,
                     last_activity = CURRENT_TIMESTAMP
             """, (user_id, username, first_name, last_name))
-            await db.commit()
+            await self._conn.commit()
+        
+        self._active_cache.pop(user_id, None)
+        self._update_cached_settings(user_id)
+    
+    async def _load_user(self, user_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Загрузить статус и настройки пользователя одним запросом
+        и положить их в оба кэша
+        
+        Чтение идет с соединения-читателя без _write_lock, поэтому если за время
+        запроса в строку пользователя что-то записали, снимок в кэш не кладется
+        """
+        version = self._user_versions.get(user_id, 0)
+        async with self._acquire_reader() as reader:
+            rows = await reader.execute_fetchall("""
+                SELECT is_active, is_notifications_enabled,
+                       patient_number, patient_birthday, check_interval_minutes, 
+                       filter_period_days, last_check_time
+                FROM users WHERE user_id = ?
+            """, (user_id,))
+        
+        if rows:
+            is_active, notifications_enabled, *values = rows[0]
+            active = bool(is_active and notifications_enabled)
+            settings = dict(zip(self.USER_SETTINGS_COLUMNS, values))
+        else:
+            active, settings = False, None
+        
+        if self._user_versions.get(user_id, 0) == version:
+            now = time.monotonic()
+            self._active_cache[user_id] = (now, active)
+            self._settings_cache[user_id] = (now, settings)
+        return active, settings
     
     async def is_user_active(self, user_id: int) -> bool:
         """Проверить, активен ли пользователь"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT is_active, is_notifications_enabled FROM users WHERE user_id = ?",
-                (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return bool(row and row[0] and row[1]) if row else False
+        entry = self._active_cache.get(user_id)
+        if not entry or time.monotonic() - entry[0] >= self.ACTIVE_CACHE_TTL:
+            return (await self._load_user(user_id))[0]
+        return entry[1]
     
     async def set_notifications(self, user_id: int, enabled: bool):
         """Включить/выключить уведомления для пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
+        async with self._write_lock:
+            await self._conn.execute(
                 "UPDATE users SET is_notifications_enabled = ? WHERE user_id = ?",
                 (enabled, user_id)
             )
-            await db.commit()
+            await self._conn.commit()
+        
+        self._bump_user_version(user_id)
+        self._active_cache.pop(user_id, None)
     
     async def get_active_users(self) -> List[int]:
         """Получить список активных пользователей с включенными уведомлениями"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
+        async with self._acquire_reader() as reader:
+            rows = await reader.execute_fetchall(
                 "SELECT user_id FROM users WHERE is_active = 1 AND is_notifications_enabled = 1"
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return [row[0] for row in rows]
-    
-    async def save_doctor(self, doctor_data: Dict[str, Any]):
-        """Сохранить или обновить информацию о враче/кабинете"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO doctors (
-                    id, department_id, display_name, person_id, position, position_code,
-                    room, lpu_name, lpu_address, separation, type, type_name, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(id) DO UPDATE SET
-                    display_name = excluded.display_name,
-                    room = excluded.room,
-                    last_updated = CURRENT_TIMESTAMP
-            """, (
-                doctor_data['id'],
-                doctor_data['department_id'],
-                doctor_data['display_name'],
-                doctor_data.get('person_id'),
-                doctor_data.get('position'),
-                doctor_data.get('position_code'),
-                doctor_data.get('room'),
-                doctor_data.get('lpu_name'),
-                doctor_data.get('lpu_address'),
-                doctor_data.get('separation'),
-                doctor_data.get('type'),
-                doctor_data.get('type_name')
-            ))
-            await db.commit()
+            )
+        return [row[0] for row in rows]
     
-    async def get_last_schedule_state(self, doctor_id: str, date: str) -> Optional[Dict[str, Any]]:
-        """Получить последнее состояние расписания для врача на дату"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
-                SELECT * FROM schedule_state
-                WHERE doctor_id = ? AND date = ?
-                ORDER BY checked_at DESC LIMIT 1
-            """, (doctor_id, date)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+    async def get_last_schedule_states(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Получить последние состояния расписания для нескольких пар (doctor_id, date)
+        
+        Args:
+            keys: Пары (doctor_id, date)
+            
+        Returns:
+            Словарь (doctor_id, date) -> состояние; пар без состояния в словаре нет
+        """
+        states = {}
+        
+        # Сначала отдаем состояния из кэша, в БД идем только за остальными парами
+        missing = []
+        for key in set(keys):
+            state = self._state_cache.get(key)
+            if state is None:
+                missing.append(key)
+            else:
+                self._state_cache.move_to_end(key)
+                states[key] = state
+        keys = missing
+        if not keys:
+            return states
+        
+        columns = self.SCHEDULE_STATE_COLUMNS
+        
+        # Ограничиваем число параметров в одном запросе
+        async with self._acquire_reader() as reader:
+            for start in range(0, len(keys), self.STATE_LOOKUP_CHUNK):
+                chunk = keys[start:start + self.STATE_LOOKUP_CHUNK]
+                values = ", ".join(["(?, ?)"] * len(chunk))
+                # JOIN со списком VALUES дает поиск по первичному ключу для каждой пары
+                # (с "(doctor_id, date) IN (VALUES ...)" SQLite сканирует всю таблицу)
+                rows = await reader.execute_fetchall(f"""
+                    SELECT s.doctor_id, s.date, s.count_tickets, s.time_from, s.time_to,
+                           s.doc_busy_type, s.closest_entry_time, s.checked_at
+                    FROM (VALUES {values}) AS k
+                    JOIN schedule_state AS s ON s.doctor_id = k.column1 AND s.date = k.column2
+                """, [value for key in chunk for value in key])
+                for row in rows:
+                    key = (row[0], row[1])
+                    states[key] = dict(zip(columns, row))
+                    self._cache_schedule_state(key, states[key])
+        
+        return states
     
-    async def save_schedule_state(self, schedule_data: Dict[str, Any]):
-        """Сохранить текущее состояние расписания"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO schedule_state (
-                    doctor_id, date, count_tickets, time_from, time_to,
-                    doc_busy_type, closest_entry_time, checked_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
+    async def save_check_results(self, doctors: List[Dict[str, Any]], schedules: List[Dict[str, Any]]):
+        """
+        Сохранить врачей и состояния расписания по итогам проверки одной транзакцией
+        
+        Args:
+            doctors: Данные врачей/кабинетов
+            schedules: Состояния расписания
+        """
+        if not doctors and not schedules:
+            return
+        
+        schedule_rows = [
+            (
                 schedule_data['doctor_id'],
                 schedule_data['date'],
                 schedule_data['count_tickets'],
@@ -189,109 +498,209 @@ class Database:
                 schedule_data.get('time_to'),
                 schedule_data.get('doc_busy_type'),
                 schedule_data.get('closest_entry_time')
-            ))
-            await db.commit()
+            )
+            for schedule_data in schedules
+        ]
+        
+        async with self._write_lock:
+            if doctors:
+                await self._conn.executemany(SAVE_DOCTOR_SQL, [
+                    (
+                        doctor_data['id'],
+                        doctor_data['department_id'],
+                        doctor_data['display_name'],
+                        doctor_data.get('person_id'),
+                        doctor_data.get('position'),
+                        doctor_data.get('position_code'),
+                        doctor_data.get('room'),
+                        doctor_data.get('lpu_name'),
+                        doctor_data.get('lpu_address'),
+                        doctor_data.get('separation'),
+                        doctor_data.get('type'),
+                        doctor_data.get('type_name')
+                    )
+                    for doctor_data in doctors
+                ])
+            if schedule_rows:
+                await self._conn.executemany(SAVE_SCHEDULE_STATE_SQL, schedule_rows)
+            await self._conn.commit()
+        
+        # Сохраненные состояния сразу попадают в кэш (checked_at - как CURRENT_TIMESTAMP)
+        checked_at = datetime.now(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+        columns = self.SCHEDULE_STATE_COLUMNS
+        for row in schedule_rows:
+            self._cache_schedule_state((row[0], row[1]), dict(zip(columns, row + (checked_at,))))
     
-    async def add_notification(self, user_id: int, doctor_id: str, date: str, 
-                              notification_type: str, message_text: str):
-        """Сохранить информацию об отправленном уведомлении"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+    async def add_notifications(self, user_id: int, notifications: List[Tuple[str, str, str]],
+                                notification_type: str):
+        """
+        Сохранить несколько отправленных уведомлений одной транзакцией
+        
+        Args:
+            user_id: ID пользователя
+            notifications: Список кортежей (doctor_id, date, message_text)
+            notification_type: Тип уведомления
+        """
+        if not notifications:
+            return
+        
+        async with self._write_lock:
+            await self._conn.executemany("""
                 INSERT INTO notifications (
                     user_id, doctor_id, date, notification_type, message_text, sent_at
                 ) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (user_id, doctor_id, date, notification_type, message_text))
-            await db.commit()
+            """, [
+                (user_id, doctor_id, date, notification_type, message_text)
+                for doctor_id, date, message_text in notifications
+            ])
+            await self._conn.commit()
+    
+    async def get_notified_keys(self, user_id: int, keys: Iterable[Tuple[str, str]],
+                                notification_type: str, hours: int = 24) -> Set[Tuple[str, str]]:
+        """
+        Получить пары (doctor_id, date), по которым уведомление уже отправлялось за последние N часов
+        
+        Args:
+            user_id: ID пользователя
+            keys: Пары (doctor_id, date) для проверки
+            notification_type: Тип уведомления
+            hours: Окно проверки в часах
+            
+        Returns:
+            Подмножество keys, по которым уведомление уже было
+        """
+        keys = set(keys)
+        if not keys:
+            return set()
+        
+        doctor_ids = list({doctor_id for doctor_id, _ in keys})
+        placeholders = ", ".join("?" * len(doctor_ids))
+        
+        async with self._acquire_reader() as reader:
+            rows = await reader.execute_fetchall(f"""
+                SELECT DISTINCT doctor_id, date FROM notifications
+                WHERE user_id = ? AND notification_type = ?
+                AND sent_at > ?
+                AND doctor_id IN ({placeholders})
+            """, (user_id, notification_type, self._utc_cutoff(hours), *doctor_ids))
+        return {(row[0], row[1]) for row in rows} & keys
     
-    async def was_notified(self, user_id: int, doctor_id: str, date: str, 
-                          notification_type: str, hours: int = 24) -> bool:
-        """Проверить, было ли отправлено уведомление за последние N часов"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT COUNT(*) FROM notifications
-                WHERE user_id = ? AND doctor_id = ? AND date = ? 
-                AND notification_type = ?
-                AND sent_at > datetime('now', '-' || ? || ' hours')
-            """, (user_id, doctor_id, date, notification_type, hours)) as cursor:
-                row = await cursor.fetchone()
-                return row[0] > 0 if row else False
+    async def get_recent_notifications(self, notification_type: str,
+                                       hours: int = 24) -> List[Tuple[int, str, str, str]]:
+        """
+        Получить уведомления, отправленные за последние N часов
+        
+        Returns:
+            Список кортежей (user_id, doctor_id, date, sent_at)
+        """
+        async with self._acquire_reader() as reader:
+            rows = await reader.execute_fetchall("""
+                SELECT user_id, doctor_id, date, sent_at FROM notifications
+                WHERE notification_type = ? AND sent_at > ?
+            """, (notification_type, self._utc_cutoff(hours)))
+        return [(row[0], row[1], row[2], row[3]) for row in rows]
     
     # Методы для персональных настроек пользователей
     
     async def get_user_settings(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить настройки пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
-                SELECT patient_number, patient_birthday, check_interval_minutes, 
-                       filter_period_days, last_check_time
-                FROM users WHERE user_id = ?
-            """, (user_id,)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        entry = self._settings_cache.get(user_id)
+        if not entry or time.monotonic() - entry[0] >= self.SETTINGS_CACHE_TTL:
+            settings = (await self._load_user(user_id))[1]
+        else:
+            settings = entry[1]
+        return dict(settings) if settings else None
     
     async def update_patient_info(self, user_id: int, patient_number: str, patient_birthday: str):
-        """Обновить данные полиса пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                UPDATE users 
+        """Обновить данные полиса пользователя (и сразу прогреть кэш настроек)"""
+        async with self._write_lock:
+            rows = await self._conn.execute_fetchall("""
+                UPDATE users
                 SET patient_number = ?, patient_birthday = ?
                 WHERE user_id = ?
+                RETURNING patient_number, patient_birthday, check_interval_minutes,
+                          filter_period_days, last_check_time
             """, (patient_number, patient_birthday, user_id))
-            await db.commit()
+            await self._conn.commit()
+        
+        self._bump_user_version(user_id)
+        if rows:
+            self._settings_cache[user_id] = (time.monotonic(), dict(rows[0]))
+        else:
+            # Пользователя нет в БД - ничего не кэшируем
+            self._settings_cache.pop(user_id, None)
     
     async def update_check_interval(self, user_id: int, interval_minutes: int):
         """Обновить интервал проверки (5 минут - 1 день)"""
         # Валидация: минимум 5 минут, максимум 1440 минут (24 часа)
         interval_minutes = max(5, min(1440, interval_minutes))
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with self._write_lock:
+            await self._conn.execute("""
                 UPDATE users 
                 SET check_interval_minutes = ?
                 WHERE user_id = ?
             """, (interval_minutes, user_id))
-            await db.commit()
+            await self._conn.commit()
+        
+        self._update_cached_settings(user_id, check_interval_minutes=interval_minutes)
     
     async def update_filter_period(self, user_id: int, period_days: int):
         """Обновить период фильтрации записей (1-30 дней)"""
         # Валидация: минимум 1 день, максимум 30 дней
         period_days = max(1, min(30, period_days))
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with self._write_lock:
+            await self._conn.execute("""
                 UPDATE users 
                 SET filter_period_days = ?
                 WHERE user_id = ?
             """, (period_days, user_id))
-            await db.commit()
+            await self._conn.commit()
+        
+        self._update_cached_settings(user_id, filter_period_days=period_days)
     
     async def update_last_check_time(self, user_id: int):
         """Обновить время последней проверки"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with self._write_lock:
+            await self._conn.execute("""
                 UPDATE users 
                 SET last_check_time = CURRENT_TIMESTAMP
                 WHERE user_id = ?
             """, (user_id,))
-            await db.commit()
+            await self._conn.commit()
+        
+        # CURRENT_TIMESTAMP в SQLite - время UTC в формате ГГГГ-ММ-ДД ЧЧ:ММ:СС
+        self._update_cached_settings(
+            user_id, last_check_time=datetime.now(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+        )
     
-    async def get_users_to_check(self) -> List[Dict[str, Any]]:
-        """Получить список пользователей, которым пора делать проверку"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
-                SELECT user_id, patient_number, patient_birthday, 
-                       check_interval_minutes, filter_period_days
-                FROM users 
+    async def claim_users_to_check(self) -> List[Dict[str, Any]]:
+        """
+        Получить пользователей, которым пора делать проверку,
+        и сразу отметить у них время последней проверки
+        
+        Выборка и обновление выполняются одним запросом UPDATE ... RETURNING
+        (одна транзакция на тик планировщика вместо commit на каждого пользователя)
+        """
+        async with self._write_lock:
+            rows = await self._conn.execute_fetchall("""
+                UPDATE users
+                SET last_check_time = CURRENT_TIMESTAMP
                 WHERE is_active = 1 
                   AND is_notifications_enabled = 1
                   AND patient_number IS NOT NULL 
                   AND patient_birthday IS NOT NULL
                   AND (
                     last_check_time IS NULL 
-                    OR datetime(last_check_time, '+' || check_interval_minutes || ' minutes') <= datetime('now')
+                    OR last_check_time <= datetime(?, '-' || check_interval_minutes || ' minutes')
                   )
-            """) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                RETURNING user_id, patient_number, patient_birthday, 
+                          check_interval_minutes, filter_period_days, last_check_time
+            """, (datetime.now(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT),))
+            await self._conn.commit()
+        
+        users = [dict(row) for row in rows]
+        for user in users:
+            self._update_cached_settings(user['user_id'], last_check_time=user['last_check_time'])
+        return users
@@ -1,6 +1,8 @@
 import asyncio
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
@@ -16,15 +18,24 @@ from bot.settings_handlers import SettingsHandlers, settings_router
 from bot.middlewares import WhitelistMiddleware
 from bot.notifier import NotificationService
 
-# Настройка логирования
+# Настройка логирования: запись в консоль и файл выполняется в отдельном потоке,
+# event loop только кладет записи в очередь
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(log_formatter)
+file_handler = logging.FileHandler('bot.log', encoding='utf-8')
+file_handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+# В очередь уходит только текст сообщения, полное форматирование - в обработчиках слушателя
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+log_listener = QueueListener(log_queue, stream_handler, file_handler)
 logging.basicConfig(
     level=getattr(logging, Config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+    handlers=[queue_handler]
 )
+log_listener.start()
 
 logger = logging.getLogger(__name__)
 
@@ -98,45 +109,8 @@ class DoctorNotificationBot:
             if new_appointments:
                 logger.info(f"Найдено {len(new_appointments)} новых записей для пользователя {user_id}")
                 
-                # Отправляем уведомления конкретному пользователю
-                for appointment in new_appointments:
-                    try:
-                        # Проверяем, не отправляли ли уже
-                        was_sent = await self.db.was_notified(
-                            user_id=user_id,
-                            doctor_id=appointment['id'],
-                            date=appointment['date'],
-                            notification_type='new_appointment',
-                            hours=24
-                        )
-                        
-                        if was_sent:
-                            continue
-                        
-                        # Форматируем и отправляем сообщение
-                        from utils.formatter import MessageFormatter
-                        formatter = MessageFormatter()
-                        message_text = formatter.format_appointment(appointment)
-                        
-                        await self.bot.send_message(
-                            chat_id=user_id,
-                            text=message_text,
-                            parse_mode="HTML"
-                        )
-                        
-                        # Сохраняем информацию об отправленном уведомлении
-                        await self.db.add_notification(
-                            user_id=user_id,
-                            doctor_id=appointment['id'],
-                            date=appointment['date'],
-                            notification_type='new_appointment',
-                            message_text=message_text
-                        )
-                        
-                        logger.info(f"Уведомление отправлено пользователю {user_id}: {appointment['display_name']}")
-                        
-                    except Exception as e:
-                        logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+                # Уведомления: одна проверка дублей, параллельная отправка, одна запись в БД
+                await self.notifier.notify_user(user_id, new_appointments)
             else:
                 logger.debug(f"Новых записей для пользователя {user_id} не найдено")
                 
@@ -151,6 +125,9 @@ class DoctorNotificationBot:
         await self.db.init_db()
         logger.info("База данных инициализирована")
         
+        # Недавние уведомления для проверки дублей без запросов к БД
+        await self.notifier.load_recent_notifications()
+        
         # Настройка планировщика для персональных проверок
         self.scheduler.set_check_callback(self.check_user_appointments_callback)
         self.scheduler.start()
@@ -166,6 +143,12 @@ class DoctorNotificationBot:
         # Останавливаем планировщик
         await self.scheduler.stop()
         
+        # Закрываем HTTP-сессию API клиента
+        await self.api_client.close()
+        
+        # Закрываем соединение с БД
+        await self.db.close()
+        
         # Закрываем бота
         await self.bot.session.close()
         
@@ -199,3 +182,6 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"Неожиданная ошибка: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        # Дописываем оставшиеся в очереди записи лога
+        log_listener.stop()
@@ -1,7 +1,6 @@
+import asyncio
 import logging
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-from typing import Callable
+from typing import Callable, Optional
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -11,8 +10,9 @@ class MonitorScheduler:
     """Планировщик для периодической проверки API"""
     
     def __init__(self):
-        self.scheduler = AsyncIOScheduler()
         self.check_callback = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
     
     def set_check_callback(self, callback: Callable):
         """
@@ -23,32 +23,49 @@ class MonitorScheduler:
         """
         self.check_callback = callback
     
+    async def _run(self):
+        """Цикл периодической проверки: ожидание интервала, затем вызов callback"""
+        interval = Config.CHECK_INTERVAL * 60
+        
+        while not self._stop_event.is_set():
+            # Ожидание прерывается сразу при остановке планировщика
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            
+            try:
+                await self.check_callback()
+            except Exception as e:
+                logger.error(f"Ошибка при периодической проверке: {e}", exc_info=True)
+    
     def start(self):
         """Запустить планировщик"""
         if not self.check_callback:
             raise ValueError("Callback функция не установлена. Используйте set_check_callback()")
         
-        # Добавляем задачу на периодическое выполнение
-        self.scheduler.add_job(
-            self.check_callback,
-            trigger=IntervalTrigger(minutes=Config.CHECK_INTERVAL),
-            id='check_appointments',
-            name='Проверка доступных записей',
-            replace_existing=True
-        )
+        if self.is_running():
+            logger.warning("Планировщик уже запущен")
+            return
         
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._run())
         logger.info(f"Планировщик запущен. Интервал проверки: {Config.CHECK_INTERVAL} минут")
-        self.scheduler.start()
     
-    def stop(self):
+    async def stop(self):
         """Остановить планировщик"""
-        if self.scheduler.running:
-            self.scheduler.shutdown()
-            logger.info("Планировщик остановлен")
+        if not self.is_running():
+            return
+        
+        self._stop_event.set()
+        await self._task
+        self._task = None
+        logger.info("Планировщик остановлен")
     
     def is_running(self) -> bool:
         """Проверить, работает ли планировщик"""
-        return self.scheduler.running
+        return self._task is not None and not self._task.done()
     
     async def trigger_now(self):
         """Запустить проверку немедленно"""
@@ -1,6 +1,7 @@
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from database.db import Database
 from api.client import ZdravAPIClient
 from api.parser import AppointmentParser
@@ -8,6 +9,17 @@ from api.parser import AppointmentParser
 logger = logging.getLogger(__name__)
 
 
+def parse_iso_date(value: str) -> Optional[date]:
+    """Разобрать дату ГГГГ-ММ-ДД; None, если строка не является такой датой"""
+    # Дешевая проверка вида строки до вызова парсера
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
 class AppointmentTracker:
     """Отслеживание изменений в доступных записях"""
     
@@ -24,52 +36,60 @@ class AppointmentTracker:
             Список новых/измененных записей
         """
         new_appointments = []
+        schedule_states = []
+        # Врачи по id: у одного врача несколько записей, сохраняем его один раз
+        doctors = {}
         
         # Получаем данные из API для всех отделений
         all_data = await self.api_client.get_all_departments()
         
+        available_appointments = []
         for department_id, api_response in all_data.items():
             if not api_response:
                 logger.warning(f"Не удалось получить данные для department {department_id}")
                 continue
             
-            # Извлекаем доступные записи
-            available_appointments = self.parser.extract_available_appointments(
-                api_response, department_id
+            # Извлекаем доступные записи (разбор ответа - вне цикла событий)
+            available_appointments.extend(
+                await asyncio.to_thread(self.parser.extract_available_appointments, api_response, department_id)
             )
+        
+        # Последние состояния всех записей получаем одним запросом
+        last_states = await self.db.get_last_schedule_states(
+            (appointment['id'], appointment['date']) for appointment in available_appointments
+        )
+        
+        # Проверяем каждую запись на новизну
+        for appointment in available_appointments:
+            last_state = last_states.get((appointment['id'], appointment['date']))
             
-            # Проверяем каждую запись на новизну
-            for appointment in available_appointments:
-                is_new = await self._is_new_or_changed(appointment)
-                
-                if is_new:
-                    new_appointments.append(appointment)
-                    logger.info(
-                        f"Новая запись: {appointment['display_name']}, "
-                        f"дата: {appointment['date']}, талонов: {appointment['count_tickets']}"
-                    )
-                
-                # Сохраняем врача и состояние расписания
-                await self._save_appointment_state(appointment)
+            if self._is_new_or_changed(appointment, last_state):
+                new_appointments.append(appointment)
+                logger.info(
+                    "Новая запись: %s, дата: %s, талонов: %s",
+                    appointment['display_name'], appointment['date'], appointment['count_tickets']
+                )
+            
+            # Врачей и состояния расписания копим для сохранения одной транзакцией
+            doctors[appointment['id']] = appointment
+            schedule_states.append(self._build_schedule_state(appointment))
+        
+        await self.db.save_check_results(list(doctors.values()), schedule_states)
         
         return new_appointments
     
-    async def _is_new_or_changed(self, appointment: Dict[str, Any]) -> bool:
+    @staticmethod
+    def _is_new_or_changed(appointment: Dict[str, Any], last_state: Optional[Dict[str, Any]]) -> bool:
         """
         Проверить, является ли запись новой или измененной
         
         Args:
             appointment: Данные о записи
+            last_state: Последнее сохраненное состояние расписания (None, если его нет)
             
         Returns:
             True если запись новая или изменилась
         """
-        doctor_id = appointment['id']
-        date = appointment['date']
-        
-        # Получаем последнее сохраненное состояние
-        last_state = await self.db.get_last_schedule_state(doctor_id, date)
-        
         # Если записи нет в БД - это новая запись
         if not last_state:
             return True
@@ -86,27 +106,20 @@ class AppointmentTracker:
         if current_tickets > last_tickets:
             return True
         
-        # Проверяем изменение ближайшей записи
-        current_closest = appointment.get('closest_entry_time', '')
-        last_closest = last_state.get('closest_entry_time', '')
-        
-        if current_closest and current_closest != last_closest:
-            return True
-        
-        return False
+        # Проверяем изменение ближайшей записи (парсер всегда заполняет поле,
+        # пустая строка - ближайшей записи нет)
+        current_closest = appointment['closest_entry_time']
+        return bool(current_closest) and current_closest != last_state['closest_entry_time']
     
-    async def _save_appointment_state(self, appointment: Dict[str, Any]):
+    @staticmethod
+    def _build_schedule_state(appointment: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Сохранить текущее состояние записи
+        Подготовить состояние расписания для сохранения
         
         Args:
             appointment: Данные о записи
         """
-        # Сохраняем информацию о враче
-        await self.db.save_doctor(appointment)
-        
-        # Сохраняем состояние расписания
-        schedule_data = {
+        return {
             'doctor_id': appointment['id'],
             'date': appointment['date'],
             'count_tickets': appointment['count_tickets'],
@@ -115,8 +128,6 @@ class AppointmentTracker:
             'doc_busy_type': appointment.get('doc_busy_type'),
             'closest_entry_time': appointment.get('closest_entry_time')
         }
-        
-        await self.db.save_schedule_state(schedule_data)
     
     async def manual_check(self, patient_number: str = None, patient_birthday: str = None) -> Dict[str, Any]:
         """
@@ -134,7 +145,11 @@ class AppointmentTracker:
             'by_department': {}
         }
         
-        all_data = await self.api_client.get_all_departments(patient_number, patient_birthday)
+        # Результат только показывается пользователю, поэтому при сбое API
+        # допустимы устаревшие данные из кэша
+        all_data = await self.api_client.get_all_departments(
+            patient_number, patient_birthday, allow_stale=True
+        )
         
         for department_id, api_response in all_data.items():
             if not api_response:
@@ -144,8 +159,8 @@ class AppointmentTracker:
                 }
                 continue
             
-            appointments = self.parser.extract_available_appointments(
-                api_response, department_id
+            appointments = await asyncio.to_thread(
+                self.parser.extract_available_appointments, api_response, department_id
             )
             
             stats['total_appointments'] += len(appointments)
@@ -172,89 +187,89 @@ class AppointmentTracker:
             Список реально новых записей (не появившихся из-за нового дня)
         """
         new_appointments = []
+        schedule_states = []
+        # Врачи по id: у одного врача несколько записей, сохраняем его один раз
+        doctors = {}
         
-        # Вычисляем максимальную дату для фильтрации
-        max_date = (datetime.now() + timedelta(days=filter_period_days)).date()
+        # Граничные даты вычисляем один раз на проверку
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        # Даты ГГГГ-ММ-ДД упорядочены так же, как строки, поэтому границу периода
+        # сравниваем со строкой и не разбираем даты записей вне периода
+        max_date = (today + timedelta(days=filter_period_days)).isoformat()
         
         # Получаем данные из API
         all_data = await self.api_client.get_all_departments(patient_number, patient_birthday)
         
+        available_appointments = []
         for department_id, api_response in all_data.items():
             if not api_response:
                 continue
             
-            # Извлекаем доступные записи
-            available_appointments = self.parser.extract_available_appointments(
-                api_response, department_id
+            # Извлекаем доступные записи (разбор ответа - вне цикла событий)
+            extracted = await asyncio.to_thread(
+                self.parser.extract_available_appointments, api_response, department_id
             )
-            
-            # Проверяем каждую запись
-            for appointment in available_appointments:
+            for appointment in extracted:
                 # Фильтр по дате - только записи в пределах периода
-                try:
-                    apt_date = datetime.strptime(appointment['date'], '%Y-%m-%d').date()
-                    if apt_date > max_date:
-                        continue  # Пропускаем записи слишком далеко в будущем
-                except:
-                    continue
+                if appointment['date'] > max_date:
+                    continue  # Пропускаем записи слишком далеко в будущем
                 
-                # Проверяем, является ли запись реально новой
-                is_really_new = await self._is_really_new_appointment(appointment, user_id)
+                apt_date = parse_iso_date(appointment['date'])
+                if apt_date is None:
+                    continue  # Пропускаем записи с некорректной датой
                 
-                if is_really_new:
-                    new_appointments.append(appointment)
-                    logger.info(
-                        f"Новая запись для пользователя {user_id}: "
-                        f"{appointment['display_name']}, дата: {appointment['date']}, "
-                        f"талонов: {appointment['count_tickets']}"
-                    )
-                
-                # Сохраняем состояние с привязкой к пользователю
-                await self._save_user_appointment_state(appointment, user_id)
+                # Разобранную дату храним рядом с записью, чтобы не разбирать ее повторно
+                available_appointments.append((appointment, apt_date))
+        
+        # Последние состояния всех записей получаем одним запросом
+        last_states = await self.db.get_last_schedule_states(
+            (appointment['id'], appointment['date']) for appointment, _ in available_appointments
+        )
+        
+        # Проверяем каждую запись
+        for appointment, apt_date in available_appointments:
+            last_state = last_states.get((appointment['id'], appointment['date']))
+            
+            # Проверяем, является ли запись реально новой
+            if self._is_really_new_appointment(appointment, apt_date, last_state, tomorrow):
+                new_appointments.append(appointment)
+                logger.info(
+                    "Новая запись для пользователя %s: %s, дата: %s, талонов: %s",
+                    user_id, appointment['display_name'], appointment['date'], appointment['count_tickets']
+                )
+            
+            # Информацию о враче (общая для всех) и состояние расписания
+            # копим для сохранения одной транзакцией
+            doctors[appointment['id']] = appointment
+            schedule_states.append(self._build_schedule_state(appointment))
+        
+        await self.db.save_check_results(list(doctors.values()), schedule_states)
         
         return new_appointments
     
-    async def _is_really_new_appointment(self, appointment: Dict[str, Any], user_id: int) -> bool:
+    @staticmethod
+    def _is_really_new_appointment(appointment: Dict[str, Any], apt_date: date,
+                                   last_state: Optional[Dict[str, Any]], tomorrow: date) -> bool:
         """
         Проверить, является ли запись РЕАЛЬНО новой (не просто новый день в расписании)
         
         Args:
             appointment: Данные о записи
-            user_id: ID пользователя
+            apt_date: Дата записи
+            last_state: Последнее сохраненное состояние расписания (None, если его нет)
+            tomorrow: Завтрашняя дата
             
         Returns:
             True если запись реально новая (кто-то отказался, появились талоны и т.д.)
         """
-        doctor_id = appointment['id']
-        date = appointment['date']
-        
-        # Получаем последнее состояние для этого пользователя
-        last_state = await self.db.get_last_schedule_state(doctor_id, date)
-        
         current_tickets = appointment['count_tickets']
         
         # Если записи никогда не было в БД
         if not last_state:
-            # Проверяем дату записи - если это завтрашний или более поздний день,
-            # и талонов > 0, то это может быть просто новый день в расписании
-            try:
-                apt_date = datetime.strptime(date, '%Y-%m-%d').date()
-                today = datetime.now().date()
-                
-                # Если дата записи более чем через 1 день и это первая проверка
-                if apt_date > today + timedelta(days=1) and current_tickets > 0:
-                    # Это новый день в расписании, не реальная новая запись
-                    return False
-                
-                # Если это завтра или сегодня и есть талоны - это интересно
-                if apt_date <= today + timedelta(days=1) and current_tickets > 0:
-                    return True
-                    
-            except:
-                pass
-            
-            # Если есть талоны - считаем новой записью
-            return current_tickets > 0
+            # Если дата записи позже завтрашнего дня - это просто новый день в расписании,
+            # не реальная новая запись. Сегодня или завтра с талонами - это интересно
+            return current_tickets > 0 and apt_date <= tomorrow
         
         last_tickets = last_state['count_tickets']
         
@@ -268,27 +283,3 @@ class AppointmentTracker:
             return True
         
         return False
-    
-    async def _save_user_appointment_state(self, appointment: Dict[str, Any], user_id: int):
-        """
-        Сохранить состояние записи для пользователя
-        
-        Args:
-            appointment: Данные о записи
-            user_id: ID пользователя
-        """
-        # Сохраняем информацию о враче (общая для всех)
-        await self.db.save_doctor(appointment)
-        
-        # Сохраняем состояние расписания
-        schedule_data = {
-            'doctor_id': appointment['id'],
-            'date': appointment['date'],
-            'count_tickets': appointment['count_tickets'],
-            'time_from': appointment.get('time_from'),
-            'time_to': appointment.get('time_to'),
-            'doc_busy_type': appointment.get('doc_busy_type'),
-            'closest_entry_time': appointment.get('closest_entry_time')
-        }
-        
-        await self.db.save_schedule_state(schedule_data)
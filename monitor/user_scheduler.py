@@ -1,10 +1,19 @@
 import logging
 import asyncio
-from typing import Callable
+import time
+from typing import Any, Callable, Dict
 from database.db import Database
 
 logger = logging.getLogger(__name__)
 
+# Период цикла проверки пользователей (в секундах)
+CHECK_LOOP_INTERVAL = 60
+# Окно, по которому разносятся проверки пользователей внутри цикла (в секундах):
+# у каждого пользователя постоянное смещение, чтобы проверки не шли пачкой к API
+USER_STAGGER_WINDOW = 30
+# Максимум одновременно выполняющихся проверок пользователей
+USER_CHECK_CONCURRENCY = 8
+
 
 class UserScheduler:
     """Планировщик для проверки каждого пользователя по его индивидуальному расписанию"""
@@ -14,6 +23,7 @@ class UserScheduler:
         self.check_callback = None
         self.is_running = False
         self._task = None
+        self._semaphore = asyncio.Semaphore(USER_CHECK_CONCURRENCY)
     
     def set_check_callback(self, callback: Callable):
         """
@@ -29,41 +39,59 @@ class UserScheduler:
         logger.info("Планировщик пользователей запущен")
         
         while self.is_running:
+            tick_start = time.monotonic()
             try:
-                # Получаем список пользователей, которым пора делать проверку
-                users_to_check = await self.db.get_users_to_check()
+                # Получаем пользователей, которым пора делать проверку
+                # (время последней проверки отмечается сразу при выборке)
+                users_to_check = await self.db.claim_users_to_check()
                 
                 if users_to_check:
-                    logger.info(f"Найдено {len(users_to_check)} пользователей для проверки")
+                    logger.info("Найдено %s пользователей для проверки", len(users_to_check))
                     
-                    # Проверяем каждого пользователя
-                    for user in users_to_check:
-                        try:
-                            if self.check_callback:
-                                await self.check_callback(
-                                    user['user_id'],
-                                    user['patient_number'],
-                                    user['patient_birthday'],
-                                    user['filter_period_days']
-                                )
-                                
-                                # Обновляем время последней проверки
-                                await self.db.update_last_check_time(user['user_id'])
-                                
-                        except Exception as e:
-                            logger.error(
-                                f"Ошибка при проверке пользователя {user['user_id']}: {e}",
-                                exc_info=True
-                            )
+                    # Проверяем пользователей параллельно, каждого - в его слоте внутри окна
+                    await asyncio.gather(
+                        *(self._run_user_check(user, tick_start + user['user_id'] % USER_STAGGER_WINDOW)
+                          for user in users_to_check)
+                    )
                 else:
                     logger.debug("Нет пользователей для проверки в данный момент")
                 
-                # Пауза между циклами проверки (1 минута)
-                await asyncio.sleep(60)
-                
             except Exception as e:
-                logger.error(f"Ошибка в цикле планировщика: {e}", exc_info=True)
-                await asyncio.sleep(60)
+                logger.error("Ошибка в цикле планировщика: %s", e, exc_info=True)
+            
+            # Следующий цикл начинается через минуту после начала текущего,
+            # а не после его окончания
+            elapsed = time.monotonic() - tick_start
+            if elapsed > CHECK_LOOP_INTERVAL:
+                logger.warning("Цикл проверки занял %.1f с, что больше интервала %s с", elapsed, CHECK_LOOP_INTERVAL)
+            await asyncio.sleep(max(0, CHECK_LOOP_INTERVAL - elapsed))
+    
+    async def _run_user_check(self, user: Dict[str, Any], start_at: float):
+        """
+        Проверить одного пользователя в назначенное время
+        
+        Args:
+            user: Данные пользователя из claim_users_to_check
+            start_at: Момент запуска проверки (time.monotonic)
+        """
+        delay = start_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        async with self._semaphore:
+            try:
+                if self.check_callback:
+                    await self.check_callback(
+                        user['user_id'],
+                        user['patient_number'],
+                        user['patient_birthday'],
+                        user['filter_period_days']
+                    )
+            except Exception as e:
+                logger.error(
+                    "Ошибка при проверке пользователя %s: %s", user['user_id'], e,
+                    exc_info=True
+                )
     
     def start(self):
         """Запустить планировщик"""
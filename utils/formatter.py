@@ -1,5 +1,117 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain, islice
+
+# Названия дней недели по номеру datetime.weekday() (0 - понедельник)
+DAY_NAMES_RU = (
+    'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'
+)
+DAY_NAMES_RU_SHORT = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+# Иконки по типу расписания: 1 - врач, остальные - кабинет
+TYPE_ICONS = {1: "👨‍⚕️"}
+DEFAULT_TYPE_ICON = "🚪"
+
+# Неизменяемые тексты сообщений
+WELCOME_TEXT = (
+    "👋 <b>Добро пожаловать в бот мониторинга записей к врачам!</b>\n\n"
+    "Я буду отслеживать появление новых талонов на запись и сразу сообщу вам.\n\n"
+    "🔧 <b>Для начала настройте профиль:</b>\n"
+    "/setup - Указать полис и дату рождения\n\n"
+    "📋 <b>Основные команды:</b>\n"
+    "/check - Проверить записи\n"
+    "/settings - Настройки профиля\n"
+    "/help - Список всех команд\n\n"
+    "✅ Уведомления включены!"
+)
+
+ACCESS_DENIED_TEXT = (
+    "⛔️ <b>Доступ запрещен</b>\n\n"
+    "К сожалению, у вас нет доступа к этому боту.\n"
+    "Обратитесь к администратору для получения доступа."
+)
+
+NOTIFICATIONS_DISABLED_TEXT = (
+    "🔕 <b>Уведомления отключены</b>\n\n"
+    "Вы больше не будете получать уведомления о новых записях.\n"
+    "Используйте /start чтобы включить их снова."
+)
+
+NO_APPOINTMENTS_TEXT = (
+    "❌ <b>Доступных записей не найдено</b>\n\n"
+    "На данный момент нет свободных талонов в отслеживаемых отделениях."
+)
+
+
+# Даты в пачке записей часто совпадают, поэтому результаты разбора и форматирования
+# кэшируются (datetime и строки неизменяемы, общий объект безопасно отдавать разным вызовам)
+@lru_cache(maxsize=512)
+def format_appointment_date(value: str) -> Tuple[str, int]:
+    """
+    Отформатировать дату записи ГГГГ-ММ-ДД
+    
+    Returns:
+        Дата в виде ДД.ММ.ГГГГ и номер дня недели (0 - понедельник)
+    """
+    date_obj = datetime.strptime(value, '%Y-%m-%d')
+    return date_obj.strftime('%d.%m.%Y'), date_obj.weekday()
+
+
+@lru_cache(maxsize=512)
+def parse_closest_entry_time(value: str) -> datetime:
+    """Разобрать время ближайшей записи (ISO, московское смещение отбрасывается)"""
+    # Смещение стоит в конце строки: отрезаем его срезом, без поиска по всей строке
+    if value.endswith('+03:00'):
+        value = value[:-6]
+    return datetime.fromisoformat(value)
+
+
+def appointment_time_key(appointment: Dict[str, Any]):
+    """Ключ упорядочивания записей по времени: дата, затем время начала"""
+    return appointment['date'], appointment.get('time_from') or ''
+
+
+def format_appointment_core_lines(appointment: Dict[str, Any], day_names: Tuple[str, ...],
+                                  start_time_template: str) -> List[Optional[str]]:
+    """
+    Общие строки описания записи: врач/кабинет, должность, дата, время, талоны
+    
+    Args:
+        appointment: Данные о записи
+        day_names: Названия дней недели (DAY_NAMES_RU или DAY_NAMES_RU_SHORT)
+        start_time_template: Шаблон строки времени, когда известно только время начала
+        
+    Returns:
+        Строки сообщения; отсутствующие строки - None
+    """
+    # Каждое поле читаем из словаря один раз
+    get = appointment.get
+    time_from = get('time_from')
+    time_to = get('time_to')
+    position = get('position')
+    # Количество талонов может отсутствовать в данных
+    count_tickets = get('count_tickets') or 0
+    
+    # Иконки для типов
+    type_icon = TYPE_ICONS.get(get('type'), DEFAULT_TYPE_ICON)
+    
+    # Форматируем дату
+    try:
+        day_date, weekday = format_appointment_date(appointment['date'])
+        formatted_date = f"{day_date} ({day_names[weekday]})"
+    except (ValueError, TypeError):
+        # Дата не в формате ГГГГ-ММ-ДД - показываем как есть
+        formatted_date = appointment['date']
+    
+    return [
+        f"{type_icon} <b>{appointment['display_name']}</b>",
+        f"📋 {position}" if position else None,
+        f"\n📅 <b>Дата:</b> {formatted_date}",
+        (f"🕐 <b>Время:</b> {time_from} - {time_to}" if time_from and time_to
+         else start_time_template.format(time_from) if time_from else None),
+        f"🎫 <b>Талонов:</b> {count_tickets}" if count_tickets else None
+    ]
 
 
 class MessageFormatter:
@@ -16,71 +128,36 @@ class MessageFormatter:
         Returns:
             Отформатированное сообщение
         """
-        # Иконки для типов
-        type_icon = "👨‍⚕️" if appointment.get('type') == 1 else "🚪"
-        
-        # Форматируем дату
-        try:
-            date_obj = datetime.strptime(appointment['date'], '%Y-%m-%d')
-            formatted_date = date_obj.strftime('%d.%m.%Y (%A)')
-            # Переводим день недели на русский
-            days_ru = {
-                'Monday': 'Понедельник',
-                'Tuesday': 'Вторник', 
-                'Wednesday': 'Среда',
-                'Thursday': 'Четверг',
-                'Friday': 'Пятница',
-                'Saturday': 'Суббота',
-                'Sunday': 'Воскресенье'
-            }
-            for en, ru in days_ru.items():
-                formatted_date = formatted_date.replace(en, ru)
-        except:
-            formatted_date = appointment['date']
-        
-        # Формируем сообщение
-        lines = [
-            f"🔔 <b>Доступна запись!</b>\n",
-            f"{type_icon} <b>{appointment['display_name']}</b>"
-        ]
-        
-        if appointment.get('position'):
-            lines.append(f"📋 {appointment['position']}")
-        
-        lines.append(f"\n📅 <b>Дата:</b> {formatted_date}")
-        
-        if appointment.get('time_from') and appointment.get('time_to'):
-            lines.append(f"🕐 <b>Время:</b> {appointment['time_from']} - {appointment['time_to']}")
-        elif appointment.get('time_from'):
-            lines.append(f"🕐 <b>Время от:</b> {appointment['time_from']}")
-        
-        if appointment.get('count_tickets') > 0:
-            lines.append(f"🎫 <b>Талонов:</b> {appointment['count_tickets']}")
-        
-        if appointment.get('closest_entry_time'):
+        # Поля, которых нет в общих строках, читаем из словаря один раз
+        get = appointment.get
+        closest_entry_time = get('closest_entry_time')
+        room = get('room')
+        lpu_name = get('lpu_name')
+        lpu_address = get('lpu_address')
+        separation = get('separation')
+        phone = get('phone')
+        
+        closest_line = None
+        if closest_entry_time:
             try:
-                closest_dt = datetime.fromisoformat(appointment['closest_entry_time'].replace('+03:00', ''))
-                closest_formatted = closest_dt.strftime('%d.%m.%Y %H:%M')
-                lines.append(f"⏰ <b>Ближайшая запись:</b> {closest_formatted}")
-            except:
-                pass
+                closest_dt = parse_closest_entry_time(closest_entry_time)
+                closest_line = f"⏰ <b>Ближайшая запись:</b> {closest_dt.strftime('%d.%m.%Y %H:%M')}"
+            except ValueError:
+                pass  # Нераспознанное время ближайшей записи не показываем
         
-        if appointment.get('room'):
-            lines.append(f"🏥 <b>Кабинет:</b> {appointment['room']}")
-        
-        if appointment.get('lpu_name'):
-            lines.append(f"\n🏛 <b>{appointment['lpu_name']}</b>")
-        
-        if appointment.get('lpu_address'):
-            lines.append(f"📍 {appointment['lpu_address']}")
-        
-        if appointment.get('separation'):
-            lines.append(f"🏢 {appointment['separation']}")
-        
-        if appointment.get('phone'):
-            lines.append(f"📞 {appointment['phone']}")
+        # Формируем сообщение: отсутствующие строки - None, они отбрасываются при сборке
+        lines = [
+            "🔔 <b>Доступна запись!</b>\n",
+            *format_appointment_core_lines(appointment, DAY_NAMES_RU, "🕐 <b>Время от:</b> {}"),
+            closest_line,
+            f"🏥 <b>Кабинет:</b> {room}" if room else None,
+            f"\n🏛 <b>{lpu_name}</b>" if lpu_name else None,
+            f"📍 {lpu_address}" if lpu_address else None,
+            f"🏢 {separation}" if separation else None,
+            f"📞 {phone}" if phone else None
+        ]
         
-        return '\n'.join(lines)
+        return '\n'.join([line for line in lines if line is not None])
     
     @staticmethod
     def format_stats(stats: Dict[str, Any]) -> str:
@@ -97,59 +174,43 @@ class MessageFormatter:
             "📊 <b>Статистика доступных записей</b>\n",
             f"<b>Всего найдено:</b> {stats['total_appointments']} записей\n"
         ]
+        append = lines.append
         
         for dept_id, dept_data in stats['by_department'].items():
             if dept_data['status'] == 'error':
-                lines.append(f"❌ <b>Отделение {dept_id}:</b> Ошибка получения данных")
+                append(f"❌ <b>Отделение {dept_id}:</b> Ошибка получения данных")
             else:
                 count = dept_data['count']
-                lines.append(f"✅ <b>Отделение {dept_id}:</b> {count} записей")
+                append(f"✅ <b>Отделение {dept_id}:</b> {count} записей")
                 
                 # Показываем врачей с доступными талонами
                 if count > 0:
-                    doctors_set = set()
-                    for apt in dept_data['appointments']:
-                        if apt['count_tickets'] > 0:
-                            doctors_set.add(apt['display_name'])
+                    doctors_set = {
+                        apt['display_name'] for apt in dept_data['appointments'] if apt['count_tickets'] > 0
+                    }
                     
                     if doctors_set:
-                        lines.append(f"   <i>Врачи: {', '.join(list(doctors_set)[:3])}" + 
-                                   (f" и ещё {len(doctors_set)-3}" if len(doctors_set) > 3 else "") + "</i>")
+                        # Первые три имени берем без копирования всего множества в список
+                        preview = ', '.join(islice(doctors_set, 3))
+                        extra = f" и ещё {len(doctors_set) - 3}" if len(doctors_set) > 3 else ""
+                        append(f"   <i>Врачи: {preview}{extra}</i>")
         
         return '\n'.join(lines)
     
     @staticmethod
     def format_welcome() -> str:
         """Приветственное сообщение"""
-        return (
-            "👋 <b>Добро пожаловать в бот мониторинга записей к врачам!</b>\n\n"
-            "Я буду отслеживать появление новых талонов на запись и сразу сообщу вам.\n\n"
-            "🔧 <b>Для начала настройте профиль:</b>\n"
-            "/setup - Указать полис и дату рождения\n\n"
-            "📋 <b>Основные команды:</b>\n"
-            "/check - Проверить записи\n"
-            "/settings - Настройки профиля\n"
-            "/help - Список всех команд\n\n"
-            "✅ Уведомления включены!"
-        )
+        return WELCOME_TEXT
     
     @staticmethod
     def format_access_denied() -> str:
         """Сообщение об отказе в доступе"""
-        return (
-            "⛔️ <b>Доступ запрещен</b>\n\n"
-            "К сожалению, у вас нет доступа к этому боту.\n"
-            "Обратитесь к администратору для получения доступа."
-        )
+        return ACCESS_DENIED_TEXT
     
     @staticmethod
     def format_notifications_disabled() -> str:
         """Сообщение об отключении уведомлений"""
-        return (
-            "🔕 <b>Уведомления отключены</b>\n\n"
-            "Вы больше не будете получать уведомления о новых записях.\n"
-            "Используйте /start чтобы включить их снова."
-        )
+        return NOTIFICATIONS_DISABLED_TEXT
     
     @staticmethod
     def format_status(is_active: bool, check_interval: int) -> str:
@@ -176,80 +237,39 @@ class MessageFormatter:
             Отформатированное сообщение
         """
         total = stats['total_appointments']
+        departments = [
+            dept_data for dept_data in stats['by_department'].values()
+            if dept_data['status'] == 'ok' and dept_data['appointments']
+        ]
         
-        # Собираем все записи
-        all_appointments = []
-        for dept_data in stats['by_department'].values():
-            if dept_data['status'] == 'ok':
-                all_appointments.extend(dept_data['appointments'])
+        # Частый случай "ничего нет" - сразу, без сборки списка записей
+        if not departments:
+            return NO_APPOINTMENTS_TEXT
         
-        if not all_appointments:
-            return (
-                "❌ <b>Доступных записей не найдено</b>\n\n"
-                "На данный момент нет свободных талонов в отслеживаемых отделениях."
-            )
+        # Собираем все записи (список нужен: по нему может быть два прохода min())
+        all_appointments = list(chain.from_iterable(
+            dept_data['appointments'] for dept_data in departments
+        ))
         
-        # Сортируем по дате (ближайшие первыми)
-        all_appointments.sort(key=lambda x: (x['date'], x.get('time_from', '')))
+        # Ближайшая запись с талонами; полная сортировка не нужна, достаточно min()
+        closest = min(
+            (apt for apt in all_appointments if apt['count_tickets'] > 0),
+            key=appointment_time_key, default=None
+        )
+        if closest is None:
+            # Показываем самую ближайшую запись даже если талонов 0
+            closest = min(all_appointments, key=appointment_time_key)
         
-        # Берем только записи с талонами > 0
-        with_tickets = [apt for apt in all_appointments if apt['count_tickets'] > 0]
+        lpu_name = closest.get('lpu_name')
+        lpu_address = closest.get('lpu_address')
         
-        if not with_tickets:
-            # Показываем самую ближайшую запись даже если талонов 0
-            closest = all_appointments[0]
-        else:
-            closest = with_tickets[0]
-        
-        # Форматируем дату
-        try:
-            date_obj = datetime.strptime(closest['date'], '%Y-%m-%d')
-            formatted_date = date_obj.strftime('%d.%m.%Y')
-            day_name = date_obj.strftime('%A')
-            days_ru = {
-                'Monday': 'Пн',
-                'Tuesday': 'Вт', 
-                'Wednesday': 'Ср',
-                'Thursday': 'Чт',
-                'Friday': 'Пт',
-                'Saturday': 'Сб',
-                'Sunday': 'Вс'
-            }
-            day_ru = days_ru.get(day_name, day_name)
-            formatted_date = f"{formatted_date} ({day_ru})"
-        except:
-            formatted_date = closest['date']
-        
-        # Формируем сообщение
+        # Формируем сообщение: отсутствующие строки - None, они отбрасываются при сборке
         lines = [
             f"✅ <b>Найдено: {total} записей</b>\n",
-            "🔔 <b>Ближайшая запись:</b>\n"
+            "🔔 <b>Ближайшая запись:</b>\n",
+            *format_appointment_core_lines(closest, DAY_NAMES_RU_SHORT, "🕐 <b>Время:</b> от {}"),
+            f"\n🏛 {lpu_name}" if lpu_name else None,
+            f"📍 {lpu_address}" if lpu_address else None
         ]
         
-        # Врач/кабинет
-        type_icon = "👨‍⚕️" if closest.get('type') == 1 else "🚪"
-        lines.append(f"{type_icon} <b>{closest['display_name']}</b>")
-        
-        if closest.get('position'):
-            lines.append(f"📋 {closest['position']}")
-        
-        # Дата и время
-        lines.append(f"\n📅 <b>Дата:</b> {formatted_date}")
-        
-        if closest.get('time_from'):
-            if closest.get('time_to'):
-                lines.append(f"🕐 <b>Время:</b> {closest['time_from']} - {closest['time_to']}")
-            else:
-                lines.append(f"🕐 <b>Время:</b> от {closest['time_from']}")
-        
-        # Талоны
-        if closest['count_tickets'] > 0:
-            lines.append(f"🎫 <b>Талонов:</b> {closest['count_tickets']}")
-        
-        # Адрес
-        if closest.get('lpu_name'):
-            lines.append(f"\n🏛 {closest['lpu_name']}")
-        if closest.get('lpu_address'):
-            lines.append(f"📍 {closest['lpu_address']}")
-        
-        return '\n'.join(lines)
+        return '\n'.join([line for line in lines if line is not None])